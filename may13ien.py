@@ -1,86 +1,624 @@
 #!/usr/bin/env python3
 import os
 import asyncio
-from dotenv import load_dotenv
 import httpx
-from openai import OpenAI
 from collections import Counter
+from contextlib import aclosing
+from dataclasses import dataclass, fields, replace
 import json
 import re
+import sys
+import csv
 import time
+import argparse
+import sqlite3
+import hashlib
+import math
+import base64
+from array import array
+import numpy as np
 
-# Environment settings
-load_dotenv()
-HELIUS_API_KEY = os.getenv("HELIUS_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Boolean settings accept the usual spellings; anything else is a configuration error
+TRUE_STRINGS = ("1", "true", "yes", "on")
+FALSE_STRINGS = ("0", "false", "no", "off", "")
 
-if not HELIUS_API_KEY:
-    raise EnvironmentError("HELIUS_API_KEY not found in environment")
-if not OPENAI_API_KEY:
-    raise EnvironmentError("OPENAI_API_KEY not found in environment")
+def parse_bool(name: str, raw: str) -> bool:
+    value = raw.strip().lower()
+    if value not in TRUE_STRINGS + FALSE_STRINGS:
+        raise ValueError(f"{name.upper()} must be one of {'/'.join(TRUE_STRINGS)} or {'/'.join(FALSE_STRINGS[:-1])}, got {raw!r}")
+    return value in TRUE_STRINGS
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Settings: read from the environment (and .env) on first use, never at import time.
+# Every field can be overridden by the upper-cased environment variable of the same name.
+@dataclass
+class Config:
+    helius_api_key: str = None
+    openai_api_key: str = None
+    # Service endpoints; point these at mock_server.py for offline benchmarks
+    helius_api_url: str = "https://api.helius.xyz"
+    helius_rpc_url: str = "https://rpc.helius.xyz"
+    openai_base_url: str = None
+    # Shared HTTP client
+    http_max_connections: int = 100
+    http_max_keepalive: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2_enabled: bool = False
+    # Requests per second per endpoint; set to match your Helius plan
+    rate_limit_helius_rest: float = 10.0
+    rate_limit_helius_rpc: float = 10.0
+    rate_limit_solana_rpc: float = 4.0
+    rate_limit_openai: float = 5.0
+    # Per-stage timeouts (seconds) for the concurrent wallet fetch
+    stage_timeout_transactions: float = 120.0
+    stage_timeout_assets: float = 30.0
+    stage_timeout_stake: float = 30.0
+    das_max_in_flight: int = 4
+    # Comma-separated Solana RPC endpoints used round-robin for stake lookups
+    solana_rpc_urls: str = "https://api.mainnet-beta.solana.com"
+    stake_cache_ttl_hours: float = 24.0
+    stake_snapshot_refresh_minutes: float = 60.0
+    solana_epoch: int = None  # fixed epoch for stake status instead of asking the RPC (offline dumps)
+    # Transaction fetching and the persistent transaction cache
+    page_prefetch_depth: int = 2
+    parse_max_in_flight: int = 5
+    tx_cache_enabled: bool = True
+    tx_cache_path: str = "tx_cache.sqlite3"
+    tx_cache_max_mb: float = 512.0
+    # LLM narrative layer
+    llm_max_concurrency: int = 4
+    llm_repair_retries: int = 1
+    llm_batch_linger: float = 0.5
+    llm_batch_max_prompt_tokens: int = 100000
+    llm_batch_max_output_tokens: int = 32000
+    report_cache_enabled: bool = True
+    report_cache_path: str = "report_cache.sqlite3"
+    report_cache_ttl_hours: float = 168.0
+    report_cache_max_entries: int = 100000
+    report_cache_bucketing: bool = True
+
+    @classmethod
+    def from_env(cls, dotenv: bool = True) -> "Config":
+        if dotenv:
+            from dotenv import load_dotenv
+            load_dotenv()
+        values = {}
+        for f in fields(cls):
+            raw = os.getenv(f.name.upper())
+            if raw is None:
+                continue
+            values[f.name] = parse_bool(f.name, raw) if f.type is bool else f.type(raw)
+        return cls(**values)
+
+    # Credentials are validated lazily, so fetch-only or score-only workers never need both keys
+    def require(self, name: str) -> str:
+        value = getattr(self, name)
+        if not value:
+            raise EnvironmentError(f"{name.upper()} not found in environment")
+        return value
+
+_config = None
+_openai_client = None
+_llm_semaphore = None
+
+def get_config() -> Config:
+    global _config
+    if _config is None:
+        _config = Config.from_env()
+    return _config
+
+_closing = set()
+
+# Install an explicit config (tests, worker pools); lazily built clients and caches are rebuilt from it
+def configure(config: Config):
+    global _config, _openai_client, _llm_semaphore, _rate_limiters, _http_client, _tx_cache, _report_cache
+    _config = config
+    _openai_client = _llm_semaphore = _rate_limiters = None
+    for cache in (_tx_cache, _report_cache):
+        if cache is not None:
+            cache.close()
+    _tx_cache = _report_cache = None
+    # The old pool is closed on the running loop; outside one, the loop it belonged to is already gone
+    client, _http_client = _http_client, None
+    if client is not None and not client.is_closed:
+        try:
+            task = asyncio.get_running_loop().create_task(client.aclose())
+        except RuntimeError:
+            return
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+def helius_api_key() -> str:
+    return get_config().require("helius_api_key")
+
+# The openai package is only imported when a report is actually requested
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        # SDK retries are off so every 429 reaches the shared rate limiter (see create_completion)
+        _openai_client = AsyncOpenAI(api_key=get_config().require("openai_api_key"), base_url=get_config().openai_base_url, max_retries=0)
+    return _openai_client
+
+# Reports generated at once; other wallets keep fetching while these wait on the LLM
+def get_llm_semaphore() -> asyncio.Semaphore:
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(get_config().llm_max_concurrency)
+    return _llm_semaphore
+
+_http_client = None
+pool_stats = Counter()
+
+# One pooled client per process, shared by every fetch
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        config = get_config()
+        _http_client = httpx.AsyncClient(
+            http2=config.http2_enabled,
+            limits=httpx.Limits(
+                max_connections=config.http_max_connections,
+                max_keepalive_connections=config.http_max_keepalive,
+                keepalive_expiry=config.http_keepalive_expiry,
+            ),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# httpcore trace hook: counts TCP connects so reuse can be derived
+async def _trace_pool(event_name: str, info: dict):
+    if event_name == "connection.connect_tcp.complete":
+        pool_stats["connections_opened"] += 1
+
+def get_pool_stats() -> dict:
+    requests = pool_stats["requests"]
+    opened = pool_stats["connections_opened"]
+    return {
+        "requests": requests,
+        "connections_opened": opened,
+        "reuse_rate": f"{1 - opened / requests:.2%}" if requests else "0.00%",
+    }
+
+# Token-bucket rate limiter shared by all wallets; halves its rate on 429 and recovers on success
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttle(self, retry_after: float):
+        self.throttled += 1
+        self.rate = max(self.max_rate / 16, self.rate / 2)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def succeed(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+# Requests per second per endpoint (Config.rate_limit_*); set to match your Helius plan
+_rate_limiters = None
+
+def get_rate_limiters() -> dict:
+    global _rate_limiters
+    if _rate_limiters is None:
+        config = get_config()
+        _rate_limiters = {name: RateLimiter(getattr(config, f"rate_limit_{name}"))
+                          for name in ("helius_rest", "helius_rpc", "solana_rpc", "openai")}
+    return _rate_limiters
+
+# Each configured endpoint maps to its bucket by URL prefix
+def get_rate_limiter(url: str):
+    config = get_config()
+    prefixes = [
+        (config.helius_api_url, "helius_rest"),
+        (config.helius_rpc_url, "helius_rpc"),
+        (config.openai_base_url or "https://api.openai.com", "openai"),
+        *((u, "solana_rpc") for u in solana_rpc_urls()),
+    ]
+    for prefix, name in prefixes:
+        if url.startswith(prefix):
+            return get_rate_limiters()[name]
+    return None
+
+# Retry-After is either delta-seconds or an HTTP date
+def parse_retry_after(value: str, default: float = 1.0) -> float:
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
 
 # Universal JSON request function
 async def fetch_json(url: str, method: str = "GET", json: dict = None, retries: int = 3, timeout: int = 30) -> dict:
+    client = get_http_client()
+    limiter = get_rate_limiter(url)
     for attempt in range(retries):
+        delay = 1.0
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(timeout)) as client:
-                resp = await (client.post(url, json=json) if method == "POST" else client.get(url))
-                resp.raise_for_status()
-                return resp.json()
+            if limiter:
+                await limiter.acquire()
+            pool_stats["requests"] += 1
+            resp = await client.request(method, url, json=json if method == "POST" else None,
+                                        timeout=httpx.Timeout(timeout), extensions={"trace": _trace_pool})
+            if resp.status_code == 429:
+                delay = parse_retry_after(resp.headers.get("Retry-After"))
+                if limiter:
+                    limiter.throttle(delay)
+            resp.raise_for_status()
+            if limiter:
+                limiter.succeed()
+            return resp.json()
         except Exception as e:
             if attempt == retries - 1:
                 raise Exception(f"Request failed: {e}")
-            await asyncio.sleep(1)
+            await asyncio.sleep(delay)
 
 # Query stake accounts
-async def get_stake_accounts(address: str) -> float:
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getProgramAccounts",
-        "params": [
-            "Stake11111111111111111111111111111111111111",
-            {
-                "encoding": "base64",
-                "filters": [
-                    {"memcmp": {"offset": 44, "bytes": address}}
-                ]
-            }
-        ]
-    }
+STAKE_PROGRAM_ID = "Stake11111111111111111111111111111111111111"
+STAKE_ACCOUNT_SIZE = 200
+STAKE_AUTHORITY_OFFSET = 44  # withdraw authority in the stake account Meta
+_rpc_cursor = 0
+
+# StakeStateV2 up to the end of Delegation; np.frombuffer maps raw account bytes onto it without copying
+STAKE_DTYPE = np.dtype([
+    ("tag", "<u4"),
+    ("rent_exempt_reserve", "<u8"),
+    ("staker", "V32"),
+    ("withdrawer", "V32"),
+    ("lockup_unix_timestamp", "<i8"),
+    ("lockup_epoch", "<u8"),
+    ("custodian", "V32"),
+    ("voter", "V32"),
+    ("stake", "<u8"),
+    ("activation_epoch", "<u8"),
+    ("deactivation_epoch", "<u8"),
+    ("warmup_cooldown_rate", "<f8"),
+])
+STAKE_DECODE_SIZE = STAKE_DTYPE.itemsize  # 188 bytes
+STAKE_TAG_DELEGATED = 2
+EPOCH_MAX = np.iinfo(np.uint64).max
+# "unknown": the current epoch was unavailable, so only the lamports total is known
+STAKE_STATUSES = ("inactive", "activating", "active", "deactivating", "unknown")
+STAKE_UNKNOWN = STAKE_STATUSES.index("unknown")
+
+def decode_stake_accounts(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype=STAKE_DTYPE)
+
+# Status code per account (index into STAKE_STATUSES) relative to the current epoch
+def stake_status(decoded: np.ndarray, epoch: int = None) -> np.ndarray:
+    if epoch is None:
+        return np.full(len(decoded), STAKE_UNKNOWN, dtype=np.int8)
+    delegated = decoded["tag"] == STAKE_TAG_DELEGATED
+    activation = decoded["activation_epoch"]
+    deactivation = decoded["deactivation_epoch"]
+    activating = delegated & (activation >= epoch) & (activation != EPOCH_MAX)
+    deactivating = delegated & (deactivation != EPOCH_MAX) & (deactivation >= epoch)
+    active = delegated & ~activating & (deactivation == EPOCH_MAX)
+    return np.select([deactivating, activating, active], [3, 1, 2], default=0).astype(np.int8)
+
+# Base64 account data from RPC -> one contiguous buffer of STAKE_DECODE_SIZE records
+def stake_records(accounts: list) -> tuple:
+    raw, lamports = [], []
+    for info in accounts:
+        data = base64.b64decode((info or {}).get("data", [""])[0])[:STAKE_DECODE_SIZE]
+        if len(data) == STAKE_DECODE_SIZE:
+            raw.append(data)
+            lamports.append(info.get("lamports", 0))
+    return b"".join(raw), np.array(lamports, dtype=np.int64)
+
+# Lamports per status (in SOL), summed over a wallet's accounts
+def stake_breakdown(raw: bytes, lamports: np.ndarray, epoch: int = None) -> dict:
+    sums = np.bincount(stake_status(decode_stake_accounts(raw), epoch), weights=lamports, minlength=len(STAKE_STATUSES))
+    return {status: float(sums[i]) / 1e9 for i, status in enumerate(STAKE_STATUSES)}
+
+_epoch = (0, 0.0)
+_epoch_failed_at = 0.0
+
+async def get_current_epoch() -> int:
+    global _epoch
+    if time.time() - _epoch[1] > 600:
+        info = await solana_rpc("getEpochInfo", [])
+        _epoch = (info["epoch"], time.time())
+    return _epoch[0]
+
+# Epoch for stake status: the configured one, else the RPC; None (lamports-only totals) when
+# unavailable, so a dead RPC never throws away balances that were already fetched
+async def stake_epoch(fallback: int = None):
+    global _epoch_failed_at
+    if get_config().solana_epoch is not None:
+        return get_config().solana_epoch
+    if fallback is not None:
+        return fallback
+    if time.time() - _epoch_failed_at < 60:
+        return None
     try:
-        data = await fetch_json("https://api.mainnet-beta.solana.com", method="POST", json=payload)
-        return sum(account.get("account", {}).get("lamports", 0) for account in data.get("result", [])) / 1e9
+        return await get_current_epoch()
     except Exception as e:
-        print(f"⚠️ Stake accounts fetch failed: {e}")
-        return 0.0
+        _epoch_failed_at = time.time()
+        print(f"⚠️ Current epoch unavailable, stake status reported as unknown: {e}", file=sys.stderr)
+        return None
+
+def solana_rpc_urls() -> list[str]:
+    return [url.strip() for url in get_config().solana_rpc_urls.split(",") if url.strip()]
+
+# Round-robin over the RPC endpoint pool; a failing endpoint hands the call to the next one
+async def solana_rpc(method: str, params: list):
+    global _rpc_cursor
+    urls = solana_rpc_urls()
+    last_error = None
+    for i in range(len(urls)):
+        url = urls[(_rpc_cursor + i) % len(urls)]
+        try:
+            data = await fetch_json(url, method="POST", json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+            if "error" in data:
+                raise Exception(data["error"].get("message", data["error"]))
+            _rpc_cursor = (_rpc_cursor + i + 1) % len(urls)
+            return data.get("result")
+        except Exception as e:
+            last_error = e
+    raise Exception(f"All Solana RPC endpoints failed: {last_error}")
+
+# Full scan, narrowed to stake-sized accounts and sliced to the decoded prefix
+async def find_stake_accounts(address: str) -> list[dict]:
+    return await solana_rpc("getProgramAccounts", [
+        STAKE_PROGRAM_ID,
+        {
+            "encoding": "base64",
+            "dataSlice": {"offset": 0, "length": STAKE_DECODE_SIZE},
+            "filters": [
+                {"dataSize": STAKE_ACCOUNT_SIZE},
+                {"memcmp": {"offset": STAKE_AUTHORITY_OFFSET, "bytes": address}}
+            ]
+        }
+    ])
+
+# Refresh known stake accounts in one call per 100 instead of a program scan
+async def fetch_stake_account_infos(pubkeys: list[str]) -> list:
+    infos = []
+    for i in range(0, len(pubkeys), 100):
+        result = await solana_rpc("getMultipleAccounts", [
+            pubkeys[i:i+100],
+            {"encoding": "base64", "dataSlice": {"offset": 0, "length": STAKE_DECODE_SIZE}}
+        ])
+        infos.extend(result.get("value", []))
+    return infos
+
+# Base58 (Bitcoin alphabet) for Solana pubkeys
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+B58_INDEX = {c: i for i, c in enumerate(B58_ALPHABET)}
+
+def b58decode(value: str) -> bytes:
+    n = 0
+    for c in value:
+        n = n * 58 + B58_INDEX[c]
+    body = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return b"\0" * (len(value) - len(value.lstrip("1"))) + body
+
+def b58encode(raw: bytes) -> str:
+    n = int.from_bytes(raw, "big")
+    out = ""
+    while n:
+        n, r = divmod(n, 58)
+        out = B58_ALPHABET[r] + out
+    return "1" * (len(raw) - len(raw.lstrip(b"\0"))) + out
+
+# Multi-wallet snapshot: every stake account loaded once and decoded into arrays,
+# with per-authority totals for each stake status
+class StakeSnapshot:
+    def __init__(self, source: str, refresh_seconds: float):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at = 0.0
+        self.failed_at = 0.0
+        self.mtime = None
+        self.task = None
+        self.accounts = decode_stake_accounts(b"")
+        self.lamports = np.zeros(0, dtype=np.int64)
+        self.index = {"staker": ({}, np.zeros((0, len(STAKE_STATUSES)))), "withdrawer": ({}, np.zeros((0, len(STAKE_STATUSES))))}
+
+    # Accounts plus the epoch recorded with them, if any
+    async def load_accounts(self) -> tuple:
+        if self.source == "rpc":
+            return await solana_rpc("getProgramAccounts", [
+                STAKE_PROGRAM_ID,
+                {
+                    "encoding": "base64",
+                    "dataSlice": {"offset": 0, "length": STAKE_DECODE_SIZE},
+                    "filters": [{"dataSize": STAKE_ACCOUNT_SIZE}]
+                }
+            ]), None
+        # Local dump: a saved getProgramAccounts response (optionally with an "epoch" key), or just its result list
+        with open(self.source, encoding="utf-8") as f:
+            data = json.load(f)
+        return (data.get("result", []), data.get("epoch")) if isinstance(data, dict) else (data, None)
+
+    # Builds the new arrays aside and swaps them in at once, so lookups never see a half-built index
+    def build(self, accounts: list[dict], epoch: int = None):
+        raw, lamports = stake_records([account.get("account") for account in accounts])
+        decoded = decode_stake_accounts(raw)
+        keep = decoded["tag"] != 0  # skip Uninitialized
+        accounts, lamports = decoded[keep], lamports[keep]
+        status = stake_status(accounts, epoch)
+        index = {}
+        for role in ("staker", "withdrawer"):
+            unique, inverse = np.unique(accounts[role], return_inverse=True)
+            sums = np.zeros((len(unique), len(STAKE_STATUSES)))
+            np.add.at(sums, (inverse, status), lamports)
+            index[role] = ({key.tobytes(): row for row, key in enumerate(unique)}, sums / 1e9)
+        self.accounts, self.lamports, self.index = accounts, lamports, index
+
+    def stale(self) -> bool:
+        if time.time() - self.failed_at < min(self.refresh_seconds, 60):
+            return False
+        if self.source != "rpc":
+            return os.path.getmtime(self.source) != self.mtime
+        return time.time() - self.loaded_at > self.refresh_seconds
+
+    async def refresh(self):
+        start_time = time.time()
+        mtime = os.path.getmtime(self.source) if self.source != "rpc" else None
+        try:
+            accounts, epoch = await self.load_accounts()
+            self.build(accounts, await stake_epoch(epoch))
+        except Exception:
+            self.failed_at = time.time()
+            raise
+        self.loaded_at, self.mtime = time.time(), mtime
+        print(f"Stake snapshot: {len(self.lamports)} accounts indexed in {time.time() - start_time:.1f}s", file=sys.stderr)
+
+    # Rebuilds run in their own task, outside any wallet's stage timeout; one at a time
+    def start_refresh(self) -> asyncio.Task:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.refresh())
+            self.task.add_done_callback(self.refresh_done)
+        return self.task
+
+    def refresh_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() and self.loaded_at:
+            print(f"⚠️ Stake snapshot refresh failed, keeping the previous index: {task.exception()}", file=sys.stderr)
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    # O(1) per wallet; a stale snapshot keeps answering from the old index while the new one builds
+    async def breakdown(self, address: str, role: str = "withdrawer") -> dict:
+        if not self.loaded_at:
+            await asyncio.shield(self.start_refresh())
+        elif self.stale():
+            self.start_refresh()
+        rows, sums = self.index[role]
+        row = rows.get(b58decode(address))
+        return {status: float(sums[row, i]) if row is not None else 0.0 for i, status in enumerate(STAKE_STATUSES)}
+
+stake_snapshot = None
+
+# Staker -> stake accounts comes from the local cache when fresh; only the accounts are re-read.
+# Failures raise so callers can report the stake stage as missing rather than 0 SOL.
+async def get_stake_breakdown(address: str) -> dict:
+    if stake_snapshot:
+        return await stake_snapshot.breakdown(address)
+    cache = get_tx_cache()
+    pubkeys = cache.get_stake_mapping(address, get_config().stake_cache_ttl_hours * 3600) if cache else None
+    if pubkeys is not None:
+        infos = await fetch_stake_account_infos(pubkeys)
+    else:
+        accounts = await find_stake_accounts(address)
+        if cache:
+            cache.put_stake_mapping(address, [account["pubkey"] for account in accounts])
+        infos = [account.get("account") for account in accounts]
+    raw, lamports = stake_records(infos)
+    return stake_breakdown(raw, lamports, await stake_epoch())
+
+async def get_stake_accounts(address: str) -> float:
+    return sum((await get_stake_breakdown(address)).values())
+
+# Native SOL and wrapped SOL share one mint key in the transaction index
+NATIVE_MINT = "So11111111111111111111111111111111111111112"
 
 # Query token assets
-async def fetch_token_profiles_das(address: str) -> list:
-    payload = {
+DAS_PAGE_LIMIT = 1000
+
+def das_payload(address: str, page: int, grand_total: bool = False) -> dict:
+    return {
         "jsonrpc": "2.0",
         "id": "fetch-assets",
         "method": "getAssetsByOwner",
         "params": {
             "ownerAddress": address,
-            "page": 1,
-            "limit": 100,
+            "page": page,
+            "limit": DAS_PAGE_LIMIT,
             "options": {
                 "showUnverifiedCollections": False,
                 "showCollectionMetadata": False,
-                "showGrandTotal": False,
+                "showGrandTotal": grand_total,
                 "showFungible": True,
-                "showNativeBalance": True,
+                "showNativeBalance": page == 1,
                 "showInscription": False,
                 "showZeroBalance": False
             }
         }
     }
-    data = await fetch_json(f"https://rpc.helius.xyz/?api-key={HELIUS_API_KEY}", method="POST", json=payload)
-    result = data.get("result", {})
 
+# Page 1 carries the grand total; the remaining pages are then fetched concurrently
+async def iter_das_pages(address: str):
+    url = f"{get_config().helius_rpc_url}/?api-key={helius_api_key()}"
+    first = (await fetch_json(url, method="POST", json=das_payload(address, 1, grand_total=True))).get("result", {})
+    yield first
+    total = first.get("grand_total")
+    if len(first.get("items", [])) < DAS_PAGE_LIMIT:
+        return
+    if total is None:
+        # No grand total reported: walk pages until a short one
+        page = 2
+        while True:
+            result = (await fetch_json(url, method="POST", json=das_payload(address, page))).get("result", {})
+            yield result
+            if len(result.get("items", [])) < DAS_PAGE_LIMIT:
+                return
+            page += 1
+
+    sem = asyncio.Semaphore(get_config().das_max_in_flight)
+
+    async def fetch_page(page: int) -> dict:
+        async with sem:
+            return (await fetch_json(url, method="POST", json=das_payload(address, page))).get("result", {})
+
+    # Explicit tasks so an early close (error, stage timeout) cancels the pages still in flight
+    pages = -(-total // DAS_PAGE_LIMIT)
+    tasks = [asyncio.create_task(fetch_page(page)) for page in range(2, pages + 1)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Only fungible assets with token_info feed the profile builder; NFTs are dropped as pages arrive
+async def fetch_das_assets(address: str) -> dict:
+    assets = {"items": [], "nativeBalance": {}}
+    pages = iter_das_pages(address)
+    async with aclosing(pages):
+        async for result in pages:
+            assets["items"].extend(a for a in result.get("items", []) if a.get("token_info"))
+            if "nativeBalance" in result:
+                assets["nativeBalance"] = result["nativeBalance"]
+    return assets
+
+def build_token_profiles(result: dict, stake: dict) -> list:
     token_profiles = []
     for asset in result.get("items", []):
         token_info = asset.get("token_info", {})
@@ -91,114 +629,567 @@ async def fetch_token_profiles_das(address: str) -> list:
         balance = float(token_info.get("balance", 0)) / 10**decimals
         if balance == 0:
             continue
-        token_profiles.append({"symbol": symbol, "balance": balance, "txVolume": ""})
+        token_profiles.append({"symbol": symbol, "mint": asset.get("id"), "balance": balance, "txVolume": ""})
 
     # Native SOL
     lamports = result.get("nativeBalance", {}).get("lamports", 0)
     if lamports:
-        token_profiles.append({"symbol": "SOL", "balance": lamports / 1e9, "txVolume": ""})
+        token_profiles.append({"symbol": "SOL", "mint": NATIVE_MINT, "balance": lamports / 1e9, "txVolume": ""})
 
     # staking SOL
-    staked = await get_stake_accounts(address)
+    staked = sum(stake.values())
     if staked > 0:
-        token_profiles.append({"symbol": "stakedSOL", "balance": staked, "txVolume": ""})
+        token_profiles.append({"symbol": "stakedSOL", "mint": None, "balance": staked, "txVolume": "",
+                               "stakeStatus": {status: round(sol, 9) for status, sol in stake.items() if sol}})
 
     return token_profiles
 
+async def fetch_token_profiles_das(address: str) -> list:
+    result, stake = await asyncio.gather(fetch_das_assets(address), get_stake_breakdown(address), return_exceptions=True)
+    if isinstance(result, Exception):
+        raise result
+    if isinstance(stake, Exception):
+        print(f"⚠️ Stake accounts fetch failed: {stake}", file=sys.stderr)
+        stake = {}
+    return build_token_profiles(result, stake)
+
+# Run one fetch stage; on failure or timeout record it and fall back to a default
+async def run_stage(name: str, coro, default, failed: list, verbose: bool = True):
+    try:
+        return await asyncio.wait_for(coro, getattr(get_config(), f"stage_timeout_{name}"))
+    except Exception as e:
+        failed.append(name)
+        if verbose:
+            print(f"⚠️ {name} stage failed: {e or type(e).__name__}")
+        return default
+
+# Persistent cache of parsed transactions keyed by signature (finalized transactions never change)
+class TxCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS txs (signature TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS txs_accessed ON txs (accessed)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS stake_accounts (staker TEXT PRIMARY KEY, pubkeys TEXT NOT NULL, updated REAL NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS wallets (address TEXT PRIMARY KEY, newest TEXT NOT NULL, small_count INTEGER NOT NULL, normal TEXT NOT NULL, updated REAL NOT NULL)")
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM txs").fetchone()[0]
+
+    def get_many(self, sigs: list[str]) -> dict:
+        found = {}
+        for i in range(0, len(sigs), 500):
+            chunk = sigs[i:i+500]
+            marks = ",".join("?" * len(chunk))
+            rows = self.db.execute(f"SELECT signature, data FROM txs WHERE signature IN ({marks})", chunk).fetchall()
+            found.update((sig, json.loads(data)) for sig, data in rows)
+            if rows:
+                self.db.execute(f"UPDATE txs SET accessed = ? WHERE signature IN ({marks})", [time.time(), *chunk])
+        self.db.commit()
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(sigs) - len(found)
+        return found
+
+    def put_many(self, txs: list[dict]):
+        now = time.time()
+        rows = []
+        for tx in txs:
+            if tx.get("signature"):
+                data = json.dumps(tx, separators=(",", ":"))
+                rows.append((tx["signature"], data, len(data), now))
+        if not rows:
+            return
+        marks = ",".join("?" * len(rows))
+        replaced = self.db.execute(f"SELECT COALESCE(SUM(size), 0) FROM txs WHERE signature IN ({marks})", [r[0] for r in rows]).fetchone()[0]
+        self.db.executemany("INSERT OR REPLACE INTO txs VALUES (?, ?, ?, ?)", rows)
+        self.size += sum(r[2] for r in rows) - replaced
+        self.stats["stored"] += len(rows)
+        if self.size > self.max_bytes:
+            self.evict()
+        self.db.commit()
+
+    # Per-wallet high-water mark: newest signature seen plus the aggregate it summarizes.
+    # normal holds [signature, small txs newer than it] pairs so the small count can be cut
+    # back to the same window as the signatures; rows in the old signature-only format are ignored.
+    def get_wallet(self, address: str):
+        row = self.db.execute("SELECT newest, small_count, normal FROM wallets WHERE address = ?", (address,)).fetchone()
+        if not row:
+            return None
+        normal = json.loads(row[2])
+        if any(not isinstance(entry, list) for entry in normal):
+            return None
+        return {"newest": row[0], "small_count": row[1], "normal": normal}
+
+    def put_wallet(self, address: str, newest: str, small_count: int, normal: list[list]):
+        self.db.execute("INSERT OR REPLACE INTO wallets VALUES (?, ?, ?, ?, ?)",
+                        (address, newest, small_count, json.dumps(normal), time.time()))
+        self.db.commit()
+
+    # Staker -> stake account pubkeys, trusted for ttl seconds before a fresh scan
+    def get_stake_mapping(self, staker: str, ttl: float):
+        row = self.db.execute("SELECT pubkeys, updated FROM stake_accounts WHERE staker = ?", (staker,)).fetchone()
+        if not row or time.time() - row[1] > ttl:
+            self.stats["stake_misses"] += 1
+            return None
+        self.stats["stake_hits"] += 1
+        return json.loads(row[0])
+
+    def put_stake_mapping(self, staker: str, pubkeys: list[str]):
+        self.db.execute("INSERT OR REPLACE INTO stake_accounts VALUES (?, ?, ?)", (staker, json.dumps(pubkeys), time.time()))
+        self.db.commit()
+
+    # Drop least-recently-used rows until the cache is back under 90% of its budget
+    def evict(self):
+        target = self.max_bytes * 0.9
+        for sig, size in self.db.execute("SELECT signature, size FROM txs ORDER BY accessed").fetchall():
+            if self.size <= target:
+                break
+            self.db.execute("DELETE FROM txs WHERE signature = ?", (sig,))
+            self.size -= size
+            self.stats["evicted"] += 1
+
+    def report(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": f"{self.stats['hits'] / lookups:.2%}" if lookups else "0.00%",
+            "size_mb": round(self.size / 2**20, 2),
+        }
+
+    def close(self):
+        self.db.close()
+
+_tx_cache = None
+
+def get_tx_cache():
+    global _tx_cache
+    config = get_config()
+    if _tx_cache is None and config.tx_cache_enabled:
+        _tx_cache = TxCache(config.tx_cache_path, int(config.tx_cache_max_mb * 2**20))
+    return _tx_cache
+
 # Transaction and signature parsing
-BASE_URL = "https://api.helius.xyz/v0/addresses"
 SMALL_TX_THRESHOLD = int(0.1 * 1e9)
 
-async def get_transactions(address: str, limit: int = 500):
-    import time
+def native_lamports(tx: dict) -> int:
+    return sum(abs(x.get("amount", 0)) for x in tx.get("nativeTransfers", []))
+
+# Streaming pipeline: pages -> transactions -> small-tx filter -> aggregate
+async def fetch_transaction_pages(address: str, until: str = None, verbose: bool = True):
     start_time = time.time()
     last_print = 0
-    normal_txs, small_count = [], 0
     before = None
+    cache = get_tx_cache()
     while True:
-        url = f"{BASE_URL}/{address}/transactions?limit=100&api-key={HELIUS_API_KEY}&includeTransactionDetails=true"
+        url = f"{get_config().helius_api_url}/v0/addresses/{address}/transactions?limit=100&api-key={helius_api_key()}&includeTransactionDetails=true"
         if before:
             url += f"&before={before}"
+        if until:
+            url += f"&until={until}"
         data = await fetch_json(url)
         if not data:
-            break
+            return
+        if cache:
+            cache.put_many(data)
         elapsed = time.time() - start_time
-        if elapsed - last_print >= 3:
+        if verbose and elapsed - last_print >= 3:
             print(f"Fetching data {int(elapsed)}s *")
             last_print = elapsed
+        yield data
+        if not (before := data[-1].get("signature")):
+            return
+
+
+# Read-ahead: a producer task requests the next before= page as soon as the cursor is known,
+# buffering up to `prefetch` pages while the consumer filters the current one
+async def iter_transaction_pages(address: str, until: str = None, verbose: bool = True, prefetch: int = None):
+    depth = get_config().page_prefetch_depth if prefetch is None else prefetch
+    pages = fetch_transaction_pages(address, until=until, verbose=verbose)
+    if depth <= 0:
+        async with aclosing(pages):
+            async for page in pages:
+                yield page
+        return
+
+    queue = asyncio.Queue(depth)
+
+    async def produce():
+        try:
+            async with aclosing(pages):
+                async for page in pages:
+                    await queue.put(page)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(produce())
+    try:
+        while (page := await queue.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def iter_transactions(pages):
+    async for page in pages:
+        for tx in await complete_parsed(page):
+            yield tx
+
+# Counts small transactions into stats and passes the normal ones through
+async def filter_small(txs, stats):
+    async for tx in txs:
+        stats.newest = stats.newest or tx.get("signature")
+        if native_lamports(tx) < SMALL_TX_THRESHOLD:
+            stats.small += 1
+        else:
+            yield tx
+
+# Columnar feature table: one compact int64 column per field instead of nested tx dicts
+TX_COLUMNS = ("timestamp", "fee", "lamports_in", "lamports_out", "type_code", "source_code", "token_transfers")
+# Fixed codes shared by every table; other values get per-table codes after these
+TX_TYPE_CODES = {"UNKNOWN": 0, "TRANSFER": 1, "SWAP": 2}
+TX_SOURCE_CODES = {"UNKNOWN": 0, "SYSTEM_PROGRAM": 1}
+
+def _code(codes: dict, value: str) -> int:
+    return codes.setdefault(value or "UNKNOWN", len(codes))
+
+class TxColumns:
+    def __init__(self, address: str = None):
+        self.address = address
+        self.columns = {name: array("q") for name in TX_COLUMNS}
+        self.type_codes = dict(TX_TYPE_CODES)
+        self.source_codes = dict(TX_SOURCE_CODES)
+
+    def append(self, tx: dict):
+        lam_in = lam_out = 0
+        for x in tx.get("nativeTransfers") or ():
+            amount = abs(x.get("amount", 0))
+            if x.get("toUserAccount") == self.address:
+                lam_in += amount
+            if x.get("fromUserAccount") == self.address:
+                lam_out += amount
+        c = self.columns
+        c["timestamp"].append(tx.get("timestamp") or 0)
+        c["fee"].append(tx.get("fee") or 0)
+        c["lamports_in"].append(lam_in)
+        c["lamports_out"].append(lam_out)
+        c["type_code"].append(_code(self.type_codes, tx.get("type")))
+        c["source_code"].append(_code(self.source_codes, tx.get("source")))
+        c["token_transfers"].append(len(tx.get("tokenTransfers") or ()))
+
+    # Zero-copy view of the columns as NumPy arrays
+    def table(self) -> dict:
+        return {name: np.frombuffer(col, dtype=np.int64) for name, col in self.columns.items()}
+
+# Vectorized per-wallet aggregates over the concatenated tables of many wallets
+def batch_table_features(tables: list[dict]) -> dict:
+    n = len(tables)
+    lengths = np.array([len(t["timestamp"]) for t in tables], dtype=np.int64)
+    wallet = np.repeat(np.arange(n), lengths)
+    col = {name: np.concatenate([t[name] for t in tables]) if n else np.zeros(0, np.int64) for name in TX_COLUMNS}
+
+    def per_wallet(weights=None):
+        return np.bincount(wallet, weights=weights, minlength=n).astype(np.float64)
+
+    count = per_wallet()
+    safe = np.maximum(count, 1)
+    day = col["timestamp"] // 86400
+    active_days = np.bincount(np.unique(np.stack([wallet, day]), axis=1)[0], minlength=n) if len(day) else np.zeros(n)
+    first = np.full(n, np.iinfo(np.int64).max)
+    last = np.zeros(n, dtype=np.int64)
+    np.minimum.at(first, wallet, col["timestamp"])
+    np.maximum.at(last, wallet, col["timestamp"])
+    return {
+        "count": count,
+        "transfer_ratio": per_wallet(col["type_code"] == TX_TYPE_CODES["TRANSFER"]) / safe,
+        "swap_ratio": per_wallet(col["type_code"] == TX_TYPE_CODES["SWAP"]) / safe,
+        "sol_in": per_wallet(col["lamports_in"]) / 1e9,
+        "sol_out": per_wallet(col["lamports_out"]) / 1e9,
+        "avg_fee": per_wallet(col["fee"]) / safe,
+        "avg_token_transfers": per_wallet(col["token_transfers"]) / safe,
+        "active_days": active_days.astype(np.float64),
+        "span_days": np.where(count > 0, (last - first) / 86400, 0.0),
+        "tx_per_active_day": count / np.maximum(active_days, 1),
+    }
+
+def table_features(table: dict) -> dict:
+    return batch_features([table])[0]
+
+def batch_features(tables: list[dict]) -> list[dict]:
+    features = batch_table_features(tables)
+    return [{name: round(float(values[i]), 6) for name, values in features.items()} for i in range(len(tables))]
 
-        for tx in data:
-            lam = sum(abs(x.get("amount", 0)) for x in tx.get("nativeTransfers", []))
-            if lam < SMALL_TX_THRESHOLD:
-                small_count += 1
+# Running aggregate of one wallet's history; only the newest sample_limit normal txs are analyzed
+class TxStats:
+    def __init__(self, sample_limit: int = 100, address: str = None):
+        self.sample_limit = sample_limit
+        self.columns = TxColumns(address)
+        self.newest = None
+        self.small = 0
+        self.normal = 0
+        self.total = 0
+        self.types = Counter()
+        self.mint_counts = Counter()
+        self.mint_volumes = Counter()
+        self.signatures = []
+        self.small_before = []
+
+    def add(self, tx: dict):
+        self.add_signature(tx.get("signature"))
+        if self.total < self.sample_limit:
+            self.total += 1
+            self.types[tx.get("type", "UNKNOWN")] += 1
+            self.index_mints(tx)
+            self.columns.append(tx)
+
+    # Counted in the window without being analyzed: beyond the sample, or its body is unavailable
+    def add_signature(self, signature: str):
+        self.normal += 1
+        self.signatures.append(signature)
+        self.small_before.append(self.small)
+
+    # One walk over tokenTransfers per tx: mint -> number of txs touching it and summed amount.
+    # Native lamports only add to SOL's volume: every analyzed tx moves at least 0.1 SOL, so
+    # counting them would pin SOL's ratio at 100%; the ratio counts wrapped-SOL transfers only.
+    def index_mints(self, tx: dict):
+        mints = set()
+        for transfer in tx.get("tokenTransfers") or ():
+            mint = transfer.get("mint")
+            if mint:
+                mints.add(mint)
+                self.mint_volumes[mint] += abs(transfer.get("tokenAmount") or 0)
+        self.mint_volumes[NATIVE_MINT] += native_lamports(tx) / 1e9
+        self.mint_counts.update(mints)
+
+# Join the mint index to DAS profiles: ratio of analyzed txs touching each token
+def apply_token_ratios(token_profiles: list, stats: TxStats):
+    total = stats.total
+    for profile in token_profiles:
+        mint = profile.get("mint")
+        n = stats.mint_counts[mint] if mint else 0
+        profile["txVolume"] = f"{n/total:.2%}" if total else "0.00%"
+        profile["transferAmount"] = round(stats.mint_volumes[mint], 9) if mint else 0.0
+
+async def stream_wallet_stats(address: str, limit: int = 500, sample_limit: int = 100, verbose: bool = True, incremental: bool = False) -> TxStats:
+    stats = TxStats(sample_limit, address)
+    cache = get_tx_cache()
+    # Incremental mode only walks back to the newest signature seen on the previous run
+    state = cache.get_wallet(address) if incremental and cache else None
+    # The page stream is closed on its own: closing the outer stage does not close inner generators,
+    # and the prefetch producer must stop as soon as enough transactions have been read
+    async with aclosing(iter_transaction_pages(address, until=state and state["newest"], verbose=verbose)) as pages, \
+            aclosing(filter_small(iter_transactions(pages), stats)) as txs:
+        async for tx in txs:
+            stats.add(tx)
+            if stats.normal >= limit:
+                break
+
+    # Merge the new head with the stored aggregate. Only the bodies still to be analyzed are
+    # loaded (from the local cache); the rest of the window is carried over as signatures.
+    # Like a full run, only small txs newer than the oldest kept normal tx are counted.
+    if state and stats.normal < limit:
+        head_small = stats.small
+        kept = state["normal"][:limit - stats.normal]
+        sampled = [sig for sig, _ in kept[:max(stats.sample_limit - stats.total, 0)]]
+        bodies = {tx.get("signature"): tx for tx in await fetch_parsed_signatures(sampled)} if sampled else {}
+        for sig, small_before in kept:
+            stats.small = head_small + small_before
+            if sig in bodies:
+                stats.add(bodies[sig])
             else:
-                normal_txs.append(tx)
-                if len(normal_txs) >= limit:
-                    break
-        if len(normal_txs) >= limit or not (sig := data[-1].get("signature")):
-            break
-        before = sig
-    return normal_txs, small_count
-
-async def fetch_parsed_signatures(sigs: list[str], batch_size: int = 20) -> list[dict]:
-    results = []
-    url = f"https://api.helius.xyz/v0/transactions?api-key={HELIUS_API_KEY}"
-    for i in range(0, len(sigs), batch_size):
-        batch = sigs[i:i+batch_size]
-        data = await fetch_json(url, method="POST", json={"transactions": batch})
-        results.extend(data)
-        await asyncio.sleep(1)
-    return results
+                stats.add_signature(sig)
+        dropped = len(state["normal"]) > len(kept)
+        stats.small = head_small + (kept[-1][1] if dropped else state["small_count"])
+        stats.newest = stats.newest or state["newest"]
+    if cache and stats.newest:
+        cache.put_wallet(address, stats.newest, stats.small, [list(pair) for pair in zip(stats.signatures, stats.small_before)])
+    return stats
 
-# Main program
-async def main():
-    print("🔍 Solana Wallet Analyzer CLI - Credit Assessment")
-    while True:
-        addr = input("Please enter address or exit to quit: ").strip()
-        if addr.lower() in ("exit", "quit"):
-            break
+async def get_transactions(address: str, limit: int = 500, verbose: bool = True):
+    stats = TxStats(0)
+    normal_txs = []
+    async with aclosing(iter_transaction_pages(address, verbose=verbose)) as pages, \
+            aclosing(filter_small(iter_transactions(pages), stats)) as txs:
+        async for tx in txs:
+            normal_txs.append(tx)
+            if len(normal_txs) >= limit:
+                break
+    return normal_txs, stats.small
 
-        txs, small_tx_count = await get_transactions(addr)
-        token_profiles = await fetch_token_profiles_das(addr)
 
-        sigs = [tx["signature"] for tx in txs][:100]
-        start_time = time.time()
-        last_print = 0
-        parsed = []
-        for i in range(0, len(sigs), 20):
-            batch = sigs[i:i+20]
-            data = await fetch_json(f"https://api.helius.xyz/v0/transactions?api-key={HELIUS_API_KEY}", method="POST", json={"transactions": batch})
-            parsed.extend(data)
-            elapsed = time.time() - start_time
-            if elapsed - last_print >= 3:
-                print(f"Calculating credit score {int(elapsed)}s *")
-                last_print = elapsed
-            await asyncio.sleep(1)
-
-        total = len(parsed)
-        count = Counter(tx.get("type", "UNKNOWN") for tx in parsed)
+async def fetch_parsed_signatures(sigs: list[str], batch_size: int = 20, max_in_flight: int = None, batch_retries: int = 2) -> list[dict]:
+    cache = get_tx_cache()
+    cached = cache.get_many(sigs) if cache else {}
+    misses = [sig for sig in sigs if sig not in cached]
 
-        for profile in token_profiles:
-            sym = profile["symbol"]
-            n = sum(1 for tx in parsed if tx.get("tokenSymbol", "") == sym)
-            profile["txVolume"] = f"{n/total:.2%}" if total else "0.00%"
+    url = f"{get_config().helius_api_url}/v0/transactions?api-key={helius_api_key()}"
+    sem = asyncio.Semaphore(max_in_flight or get_config().parse_max_in_flight)
+    batches = [misses[i:i+batch_size] for i in range(0, len(misses), batch_size)]
 
-        print("\n📝 Asset Overview:")
-        for profile in token_profiles:
-            print(f"{profile['symbol']}: {profile['balance']} (Transaction Ratio: {profile['txVolume']})")
+    async def run(batch: list[str]) -> list[dict]:
+        for attempt in range(batch_retries + 1):
+            try:
+                async with sem:
+                    return await fetch_json(url, method="POST", json={"transactions": batch})
+            except Exception as e:
+                if attempt == batch_retries:
+                    print(f"⚠️ Parse batch of {len(batch)} signatures failed: {e}", file=sys.stderr)
+                    return []
+                await asyncio.sleep(2 ** attempt)
 
-        print("\n📊 Summary:")
-        print(f"Analyzed Normal Transactions (excluding small): {total}, Small Transactions (<0.1 SOL): {small_tx_count}")
-        print(f"Transaction Types: {dict(count)}")
+    fetched = {}
+    for data in await asyncio.gather(*(run(batch) for batch in batches)):
+        if cache:
+            cache.put_many(data)
+        fetched.update((tx.get("signature"), tx) for tx in data)
 
-        prompt = f"""System:
-You are a Solana on-chain data analysis expert, specializing in credit assessment for lending protocols (such as Solend). Based on the following data, generate a concise analysis report in JSON format, in English only, output complete JSON only, no extra explanation.
-- Total transactions: {total}
-- Small transactions (<0.1 SOL): {small_tx_count}
-- Transaction types: {dict(count)}
-- Token data: {json.dumps(token_profiles, ensure_ascii=False)}
+    # Results follow the original signature order
+    return [tx for sig in sigs if (tx := cached.get(sig) or fetched.get(sig))]
+
+# Fields the scorer reads from each parsed transaction
+PARSED_TX_FIELDS = ("type", "nativeTransfers", "tokenTransfers")
+
+# Reuse the already-parsed transactions, re-parsing by signature only those missing fields
+async def complete_parsed(txs: list[dict]) -> list[dict]:
+    missing = [tx["signature"] for tx in txs if tx.get("signature") and any(f not in tx for f in PARSED_TX_FIELDS)]
+    if not missing:
+        return txs
+    reparsed = {tx.get("signature"): tx for tx in await fetch_parsed_signatures(missing)}
+    for tx in txs:
+        extra = reparsed.get(tx.get("signature"))
+        if extra:
+            for f in PARSED_TX_FIELDS:
+                if f not in tx and f in extra:
+                    tx[f] = extra[f]
+    return txs
+
+# Deterministic credit rules (the same rules the LLM prompt describes)
+HIGH_GRADE_SOL = 10.0
+MEDIUM_GRADE_SOL = 1.0
+HIGH_GRADE_TRANSFER = 0.5
+MEDIUM_GRADE_TRANSFER = 0.3
+HIGH_FREQ_SWAP = 0.5
+HIGH_SMALL_RATIO = 0.8
+
+LIQUIDITY = {"SOL": "High", "stakedSOL": "Medium", "mSOL": "Medium"}
+LIQUIDITY_RISK = {"High": "Low", "Medium": "Medium", "Low": "High"}
+
+def risk_level(value: float, high: float, medium: float) -> str:
+    return "High" if value > high else "Medium" if value > medium else "Low"
+
+def credit_grade(sol: float, transfer_ratio: float, swap_ratio: float, small_ratio: float) -> str:
+    high_risk = swap_ratio > HIGH_FREQ_SWAP or small_ratio > HIGH_SMALL_RATIO
+    if sol > HIGH_GRADE_SOL and transfer_ratio > HIGH_GRADE_TRANSFER and not high_risk:
+        return "High"
+    if sol >= MEDIUM_GRADE_SOL and transfer_ratio > MEDIUM_GRADE_TRANSFER and not high_risk:
+        return "Medium"
+    return "Low"
 
-Output requirements:
+def score_rules(total: int, small_tx_count: int, count: Counter, token_profiles: list) -> dict:
+    swaps = count.get("SWAP", 0)
+    transfers = count.get("TRANSFER", 0)
+    other = total - swaps - transfers
+    swap_ratio = swaps / total if total else 0.0
+    transfer_ratio = transfers / total if total else 0.0
+    small_ratio = small_tx_count / (total + small_tx_count) if total + small_tx_count else 0.0
+    sol = sum(p["balance"] for p in token_profiles if p["symbol"] in ("SOL", "stakedSOL"))
+    grade = credit_grade(sol, transfer_ratio, swap_ratio, small_ratio)
+
+    assets = []
+    for p in token_profiles:
+        liquidity = LIQUIDITY.get(p["symbol"], "Low")
+        assets.append({"Token": p["symbol"], "Balance": p["balance"], "Liquidity": liquidity, "Risk": LIQUIDITY_RISK[liquidity]})
+    low_liquidity = sum(1 for a in assets if a["Liquidity"] == "Low")
+
+    dust = risk_level(small_ratio, HIGH_SMALL_RATIO, 0.5)
+    arbitrage = risk_level(swap_ratio, HIGH_FREQ_SWAP, 0.2)
+    low_liq_risk = "High" if low_liquidity > 10 else "Medium" if low_liquidity else "Low"
+
+    suggestions = []
+    if sol < MEDIUM_GRADE_SOL:
+        suggestions.append("Increase SOL")
+    if transfer_ratio <= MEDIUM_GRADE_TRANSFER:
+        suggestions.append("More transfers")
+    if arbitrage != "Low":
+        suggestions.append("Reduce swaps")
+    if dust != "Low":
+        suggestions.append("Avoid dust txs")
+    if low_liq_risk != "Low":
+        suggestions.append("Limit illiquid")
+    if not suggestions:
+        suggestions.append("Maintain habits")
+
+    return {
+        "Summary": {
+            "Total Transactions": total,
+            "Small Transactions": small_tx_count,
+            "Small Transaction Ratio": f"{small_ratio:.2%}",
+            "Credit Grade": grade,
+        },
+        "Asset Overview": assets,
+        "Behavior Analysis": [
+            {"Type": "SWAP", "Count": swaps, "Ratio": f"{swap_ratio:.2%}",
+             "Assessment": {"High": "High frequency", "Medium": "Active", "Low": "Normal"}[arbitrage]},
+            {"Type": "TRANSFER", "Count": transfers, "Ratio": f"{transfer_ratio:.2%}",
+             "Assessment": "Stable" if transfer_ratio > HIGH_GRADE_TRANSFER else "Moderate" if transfer_ratio > MEDIUM_GRADE_TRANSFER else "Sparse"},
+            {"Type": "OTHER", "Count": other, "Ratio": f"{other / total if total else 0.0:.2%}", "Assessment": "Mixed" if other else "None"},
+        ],
+        "Risk": {
+            "Dust Attack": dust,
+            "High-frequency Arbitrage": arbitrage,
+            "Low Liquidity Tokens": low_liq_risk,
+        },
+        "Suggestions": suggestions,
+        "Credit Conclusion": {"High": "Creditworthy, low risk", "Medium": "Fair credit, monitor", "Low": "Weak credit, high risk"}[grade],
+    }
+
+# Vectorized scoring: one row per wallet, columns in WALLET_FEATURES order
+WALLET_FEATURES = ("sol", "staked_sol", "transfer_ratio", "swap_ratio", "small_ratio", "low_liquidity_tokens")
+GRADES = np.array(["Low", "Medium", "High"])
+RISK_LEVELS = np.array(["Low", "Medium", "High"])
+
+def wallet_feature_row(total: int, small_tx_count: int, count: dict, token_profiles: list) -> list:
+    # Summed per symbol like score_rules: wrapped and native SOL both arrive as "SOL" profiles
+    balances = Counter()
+    for p in token_profiles:
+        balances[p["symbol"]] += p["balance"]
+    seen = total + small_tx_count
+    return [
+        balances.get("SOL", 0.0),
+        balances.get("stakedSOL", 0.0),
+        count.get("TRANSFER", 0) / total if total else 0.0,
+        count.get("SWAP", 0) / total if total else 0.0,
+        small_tx_count / seen if seen else 0.0,
+        sum(1 for p in token_profiles if p["symbol"] not in LIQUIDITY),
+    ]
+
+def risk_levels(values: np.ndarray, high: float, medium: float) -> np.ndarray:
+    return (values > medium).astype(np.int8) + (values > high)
+
+# Same rules as credit_grade/score_rules, evaluated for N wallets in one pass
+def score_batch(features: np.ndarray) -> dict:
+    features = np.asarray(features, dtype=np.float64).reshape(-1, len(WALLET_FEATURES))
+    sol = features[:, 0] + features[:, 1]
+    transfer, swap, small, low_liq = features[:, 2], features[:, 3], features[:, 4], features[:, 5]
+
+    high_risk = (swap > HIGH_FREQ_SWAP) | (small > HIGH_SMALL_RATIO)
+    high = (sol > HIGH_GRADE_SOL) & (transfer > HIGH_GRADE_TRANSFER) & ~high_risk
+    medium = (sol >= MEDIUM_GRADE_SOL) & (transfer > MEDIUM_GRADE_TRANSFER) & ~high_risk
+    grade = np.where(high, 2, np.where(medium, 1, 0)).astype(np.int8)
+    return {
+        "grade_code": grade,
+        "grade": GRADES[grade],
+        "sol_total": sol,
+        "high_risk": high_risk,
+        "dust_risk": RISK_LEVELS[risk_levels(small, HIGH_SMALL_RATIO, 0.5)],
+        "arbitrage_risk": RISK_LEVELS[risk_levels(swap, HIGH_FREQ_SWAP, 0.2)],
+        "low_liquidity_risk": RISK_LEVELS[risk_levels(low_liq, 10, 0)],
+    }
+
+# Prompt and report generation
+PROMPT_RULES = """Output requirements:
 - Each analysis field should not exceed 15 characters, and the conclusion should not exceed 25 characters.
 - Include summary, asset overview, behavior analysis, risks, suggestions, and credit conclusion.
 - Summary must contain credit grade (High, Medium, Low), based on the following rules:
@@ -211,66 +1202,688 @@ Output requirements:
 - Ensure single JSON, no duplicates.
 
 Format:
-{{
-  "Summary": {{
+{
+  "Summary": {
     "Total Transactions": number,
     "Small Transactions": number,
     "Small Transaction Ratio": string,
     "Credit Grade": string
-  }},
+  },
   "Asset Overview": [
-    {{"Token": string, "Balance": number, "Liquidity": string, "Risk": string}},
+    {"Token": string, "Balance": number, "Liquidity": string, "Risk": string},
     ...
   ],
   "Behavior Analysis": [
-    {{"Type": string, "Count": number, "Ratio": string, "Assessment": string}},
+    {"Type": string, "Count": number, "Ratio": string, "Assessment": string},
     ...
   ],
-  "Risk": {{
+  "Risk": {
     "Dust Attack": string,
     "High-frequency Arbitrage": string,
     "Low Liquidity Tokens": string
-  }},
+  },
   "Suggestions": [string],
   "Credit Conclusion": string
-}}
+}
+"""
+
+def wallet_summary(total: int, small_tx_count: int, count: Counter, token_profiles: list) -> str:
+    return f"""- Total transactions: {total}
+- Small transactions (<0.1 SOL): {small_tx_count}
+- Transaction types: {dict(count)}
+- Token data: {json.dumps(token_profiles, ensure_ascii=False)}
 """
 
+def build_prompt(total: int, small_tx_count: int, count: Counter, token_profiles: list) -> str:
+    return f"""System:
+You are a Solana on-chain data analysis expert, specializing in credit assessment for lending protocols (such as Solend). Based on the following data, generate a concise analysis report in JSON format, in English only, output complete JSON only, no extra explanation.
+{wallet_summary(total, small_tx_count, count, token_profiles)}
+{PROMPT_RULES}"""
+
+# Several wallets per completion: the answer is one JSON object keyed by address
+def build_batch_prompt(items: list) -> str:
+    wallets = "\n".join(f"Wallet {addr}:\n{wallet_summary(*inputs)}" for addr, inputs in items)
+    return f"""System:
+You are a Solana on-chain data analysis expert, specializing in credit assessment for lending protocols (such as Solend). For each wallet below, generate a concise analysis report in JSON format, in English only, output complete JSON only, no extra explanation.
+Return a single JSON object whose keys are the wallet addresses and whose values are the reports.
+
+{wallets}
+{PROMPT_RULES}"""
+
+LLM_MODEL = "gpt-4.1-nano-2025-04-14"  # Assume using gpt-4.1nano, confirm availability
+REPORT_MAX_TOKENS = 800
+
+# LLM report cache: content-addressed by a canonical hash of the prompt inputs.
+# Two significant digits for amounts, whole percents for ratios, so near-identical wallets share a report
+def bucket_value(value):
+    if isinstance(value, float) and value:
+        return round(value, 1 - int(math.floor(math.log10(abs(value)))))
+    if isinstance(value, str) and value.endswith("%"):
+        return f"{round(float(value[:-1]))}%"
+    return value
+
+def report_fingerprint(total: int, small_tx_count: int, count: dict, token_profiles: list, bucketing: bool = None) -> str:
+    bucket = bucket_value if (get_config().report_cache_bucketing if bucketing is None else bucketing) else (lambda v: v)
+    canonical = {
+        "model": LLM_MODEL,
+        "total": total,
+        "small": small_tx_count,
+        "types": dict(sorted(count.items())),
+        "tokens": sorted(({k: bucket(v) for k, v in p.items() if k != "mint"} for p in token_profiles),
+                         key=lambda p: (p["symbol"], str(p["balance"]))),
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class ReportCache:
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS reports (key TEXT PRIMARY KEY, report TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS reports_accessed ON reports (accessed)")
+
+    def get(self, key: str):
+        now = time.time()
+        row = self.db.execute("SELECT report, created FROM reports WHERE key = ?", (key,)).fetchone()
+        if row and now - row[1] > self.ttl:
+            self.db.execute("DELETE FROM reports WHERE key = ?", (key,))
+            self.db.commit()
+            row = None
+        if not row:
+            self.stats["misses"] += 1
+            return None
+        self.db.execute("UPDATE reports SET accessed = ? WHERE key = ?", (now, key))
+        self.db.commit()
+        self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, report: dict):
+        now = time.time()
+        self.db.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)", (key, json.dumps(report), now, now))
+        # Expire stale entries, then trim least-recently-used beyond the entry budget
+        self.db.execute("DELETE FROM reports WHERE created < ?", (now - self.ttl,))
+        self.db.execute("DELETE FROM reports WHERE key IN (SELECT key FROM reports ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,))
+        self.db.commit()
+
+    def report(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": f"{self.stats['hits'] / lookups:.2%}" if lookups else "0.00%"}
+
+    def close(self):
+        self.db.close()
+
+_report_cache = None
+
+def get_report_cache():
+    global _report_cache
+    config = get_config()
+    if _report_cache is None and config.report_cache_enabled:
+        _report_cache = ReportCache(config.report_cache_path, config.report_cache_ttl_hours * 3600, config.report_cache_max_entries)
+    return _report_cache
+
+# Structured-output parsing: extract the JSON object from fenced/trailing text and repair truncation
+def _close_json(text: str):
+    stack, in_str, esc, comma = [], False, False, None
+    for i, ch in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack.pop() != ch:
+                return []
+            if not stack:
+                return [text[:i + 1]]
+        elif ch == ",":
+            comma = (i, "".join(reversed(stack)))
+    # Truncated: close what is open, or cut back to the last complete element
+    candidates = []
+    tail = text.rstrip()
+    if not in_str and tail and not tail[-1].isdigit():
+        candidates.append(tail + "".join(reversed(stack)))
+    if comma:
+        candidates.append(text[:comma[0]] + comma[1])
+    return candidates
+
+def repair_json(text: str):
+    text = re.sub(r"```(?:json)?", "", text)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return None
+    for candidate in _close_json(text[start:]):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+REPORT_SCHEMA = {
+    "Summary": dict,
+    "Asset Overview": list,
+    "Behavior Analysis": list,
+    "Risk": dict,
+    "Suggestions": list,
+    "Credit Conclusion": str,
+}
+REPORT_ITEM_KEYS = {
+    "Summary": ("Total Transactions", "Small Transactions", "Small Transaction Ratio", "Credit Grade"),
+    "Asset Overview": ("Token", "Balance", "Liquidity", "Risk"),
+    "Behavior Analysis": ("Type", "Count", "Ratio", "Assessment"),
+    "Risk": ("Dust Attack", "High-frequency Arbitrage", "Low Liquidity Tokens"),
+}
+
+def validate_report(report) -> list[str]:
+    if not isinstance(report, dict):
+        return ["report is not a JSON object"]
+    errors = []
+    for key, kind in REPORT_SCHEMA.items():
+        value = report.get(key)
+        if not isinstance(value, kind):
+            errors.append(f"{key}: expected {kind.__name__}")
+            continue
+        required = REPORT_ITEM_KEYS.get(key, ())
+        for item in value if kind is list else [value]:
+            if required and not (isinstance(item, dict) and all(k in item for k in required)):
+                errors.append(f"{key}: missing {', '.join(required)}")
+                break
+    grade = (report.get("Summary") or {}).get("Credit Grade") if isinstance(report.get("Summary"), dict) else None
+    if grade not in ("High", "Medium", "Low"):
+        errors.append("Summary.Credit Grade: expected High, Medium or Low")
+    return errors
+
+def validate_batch(reports) -> list[str]:
+    return [] if isinstance(reports, dict) else ["batch answer is not a JSON object"]
+
+# One chat completion through the shared OpenAI bucket: a 429 throttles it by Retry-After for every
+# wallet, transient failures back off; either is retried up to `retries` times
+async def create_completion(retries: int = 3, **kwargs):
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+    limiter = get_rate_limiters()["openai"]
+    for attempt in range(retries + 1):
+        await limiter.acquire()
         try:
-            chat_resp = client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",  # Assume using gpt-4.1nano, confirm availability
+            response = await get_openai_client().chat.completions.create(**kwargs)
+        except RateLimitError as e:
+            limiter.throttle(parse_retry_after(e.response.headers.get("retry-after")))
+            if attempt == retries:
+                raise
+            continue
+        except (APIConnectionError, InternalServerError):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(2 ** attempt)
+            continue
+        limiter.succeed()
+        return response
+
+async def generate_report(prompt: str, verbose: bool = True, max_tokens: int = REPORT_MAX_TOKENS, validate=validate_report) -> dict:
+    best = {}
+    for attempt in range(get_config().llm_repair_retries + 1):
+        try:
+            async with get_llm_semaphore():
+                chat_resp = await create_completion(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a Solana on-chain data analysis expert. Output concise JSON in English only, for credit assessment."},
+                        {"role": "user", "content": prompt},
+                    ],
+                    max_completion_tokens=max_tokens,
+                    temperature=0.5
+                )
+            choice = chat_resp.choices[0]
+            analysis = (choice.message.content or "").strip()
+        # An empty or filtered answer (no choices, no message) counts as a failed attempt
+        except (IndexError, AttributeError, TypeError) as e:
+            if verbose:
+                print(f"⚠️ OpenAI returned no usable answer: {e}")
+            continue
+        except Exception as e:
+            if verbose:
+                print(f"⚠️ OpenAI analysis failed: {e}")
+            return best
+
+        report = repair_json(analysis)
+        errors = validate(report) if report is not None else ["no JSON found"]
+        if not errors:
+            return report
+        if verbose:
+            print(f"⚠️ OpenAI returned an invalid report: {'; '.join(errors[:3])}")
+        if isinstance(report, dict) and len(report) > len(best):
+            best = report
+        # Only retry when repair could not produce a valid report; give truncated answers more room
+        if choice.finish_reason == "length":
+            max_tokens *= 2
+    return best
+
+# Streaming completions: fields become available as soon as their JSON value is complete
+def _leaves(value, path: str = ""):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _leaves(v, f"{path}.{k}" if path else k)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            yield from _leaves(v, f"{path}[{i}]")
+    else:
+        yield path, value
+
+class IncrementalJson:
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+
+    # repair_json only keeps complete values, so a field is never reported half-written
+    def feed(self, chunk: str) -> dict:
+        self.buffer += chunk
+        if not any(c in chunk for c in '",]}'):
+            return {}
+        partial = repair_json(self.buffer)
+        new = {path: v for path, v in _leaves(partial) if path and path not in self.fields} if partial is not None else {}
+        self.fields.update(new)
+        return new
+
+# Yields (path, value) per completed field, e.g. ("Summary.Credit Grade", "High"), then ("", report).
+# A path can repeat with a corrected value when the streamed answer had to be replaced.
+async def stream_report(prompt: str, max_tokens: int = REPORT_MAX_TOKENS, verbose: bool = True):
+    parser = IncrementalJson()
+    try:
+        async with get_llm_semaphore():
+            stream = await create_completion(
+                model=LLM_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a Solana on-chain data analysis expert. Output concise JSON in English only, for credit assessment."},
                     {"role": "user", "content": prompt},
                 ],
-                max_completion_tokens=800,
-                temperature=0.5
+                max_completion_tokens=max_tokens,
+                temperature=0.5,
+                stream=True,
             )
-            analysis = chat_resp.choices[0].message.content.strip()
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    for path, value in parser.feed(delta).items():
+                        yield path, value
+    except Exception as e:
+        if verbose:
+            print(f"⚠️ OpenAI streaming failed: {e}")
 
-            # Clean up possible Markdown markup
-            analysis = re.sub(r'^```json\n|```$', '', analysis).strip()
+    report = repair_json(parser.buffer)
+    if validate_report(report):
+        # Streamed answer unusable: fall back to the retrying non-streaming path, then correct every
+        # field already sent whose value changed (None: no longer in the report)
+        report = await generate_report(prompt, verbose=verbose, max_tokens=max_tokens)
+        final = {path: value for path, value in _leaves(report) if path}
+        for path, value in final.items():
+            if parser.fields.get(path, object()) != value:
+                yield path, value
+        for path in parser.fields.keys() - final.keys():
+            yield path, None
+    yield "", report
 
-            # Validate and format JSON
-            try:
-                parsed = json.loads(analysis)
-                print("\n📝 Credit Analysis:")
-                print(json.dumps(parsed, indent=2, ensure_ascii=False))
-            except json.JSONDecodeError as e:
-                print(f"⚠️ OpenAI returned invalid JSON: {analysis}")
-                print(f"Parse error: {e}")
-                analysis = "{}"
+# Batched narratives: wallets submitted within a short window share one completion request
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+class ReportBatcher:
+    def __init__(self, max_wallets: int):
+        self.max_wallets = max_wallets
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+        self.stats = Counter()
+
+    async def submit(self, addr: str, inputs: tuple) -> dict:
+        fut = asyncio.get_running_loop().create_future()
+        self.pending.append((addr, inputs, fut))
+        if len(self.pending) >= self.max_wallets:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(get_config().llm_batch_linger, self.flush)
+        return await fut
+
+    # Greedy split so each request stays under the prompt and completion token budgets
+    def split(self, items: list) -> list:
+        chunks, chunk, tokens = [], [], estimate_tokens(build_batch_prompt([]))
+        for item in items:
+            size = estimate_tokens(wallet_summary(*item[1])) + 20
+            config = get_config()
+            too_big = tokens + size > config.llm_batch_max_prompt_tokens or (len(chunk) + 1) * REPORT_MAX_TOKENS > config.llm_batch_max_output_tokens
+            if chunk and (len(chunk) >= self.max_wallets or too_big):
+                chunks.append(chunk)
+                chunk, tokens = [], estimate_tokens(build_batch_prompt([]))
+            chunk.append(item)
+            tokens += size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        items, self.pending = self.pending, []
+        for chunk in self.split(items):
+            task = asyncio.ensure_future(self.run(chunk))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    # Every future in the chunk gets a report or the error, so no submitter waits forever
+    async def run(self, chunk: list):
+        try:
+            await self.answer(chunk)
+        except asyncio.CancelledError:
+            for _, _, fut in chunk:
+                fut.cancel()
+            raise
         except Exception as e:
-            print(f"⚠️ OpenAI analysis failed: {e}")
-            analysis = "{}"
+            for _, _, fut in chunk:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    async def answer(self, chunk: list):
+        self.stats["requests"] += 1
+        prompt = build_batch_prompt([(addr, inputs) for addr, inputs, _ in chunk])
+        reports = await generate_report(prompt, verbose=False, max_tokens=min(len(chunk) * REPORT_MAX_TOKENS, get_config().llm_batch_max_output_tokens),
+                                        validate=validate_batch)
+
+        # Wallets missing from the batched answer fall back to a single-wallet request
+        async def resolve(addr, inputs, fut):
+            report = reports.get(addr) if isinstance(reports, dict) else None
+            if validate_report(report):
+                self.stats["fallbacks"] += 1
+                report = await generate_report(build_prompt(*inputs), verbose=False)
+            self.stats["wallets"] += 1
+            if not fut.done():
+                fut.set_result(report)
+
+        await asyncio.gather(*(resolve(*item) for item in chunk))
+
+report_batcher = None
+
+async def narrate(addr: str, inputs: tuple, verbose: bool = True, on_field=None) -> dict:
+    if report_batcher:
+        return await report_batcher.submit(addr, inputs)
+    if on_field is None:
+        return await generate_report(build_prompt(*inputs), verbose=verbose)
+    report = {}
+    async for path, value in stream_report(build_prompt(*inputs), verbose=verbose):
+        if path:
+            on_field(path, value)
+        else:
+            report = value
+    return report
+
+# Per-wallet pipeline: fetch -> parse -> score
+# defer_features: "features" holds the raw column table, for the caller to aggregate many wallets at once
+async def score_wallet(addr: str, verbose: bool = True, incremental: bool = False, llm: bool = False, on_field=None,
+                       defer_features: bool = False) -> dict:
+    failed = []
+    stats, assets, stake = await asyncio.gather(
+        run_stage("transactions", stream_wallet_stats(addr, verbose=verbose, incremental=incremental), TxStats(), failed, verbose),
+        run_stage("assets", fetch_das_assets(addr), {}, failed, verbose),
+        run_stage("stake", get_stake_breakdown(addr), {}, failed, verbose),
+    )
+    token_profiles = build_token_profiles(assets, stake)
+
+    total = stats.total
+    small_tx_count = stats.small
+    count = stats.types
+
+    apply_token_ratios(token_profiles, stats)
+
+    if verbose:
+        print("\n📝 Asset Overview:")
+        for profile in token_profiles:
+            print(f"{profile['symbol']}: {profile['balance']} (Transaction Ratio: {profile['txVolume']})")
+
+        print("\n📊 Summary:")
+        print(f"Analyzed Normal Transactions (excluding small): {total}, Small Transactions (<0.1 SOL): {small_tx_count}")
+        print(f"Transaction Types: {dict(count)}")
+
+    result = {
+        "address": addr,
+        "totalTransactions": total,
+        "smallTransactions": small_tx_count,
+        "transactionTypes": dict(count),
+        "features": stats.columns.table() if defer_features else table_features(stats.columns.table()),
+        "tokenProfiles": token_profiles,
+        "partial": failed,
+        "analysis": score_rules(total, small_tx_count, count, token_profiles),
+    }
+
+    # Optional LLM narrative on top of the deterministic report; a failure never costs the analysis
+    if llm:
+        cache = get_report_cache()
+        key = report_fingerprint(total, small_tx_count, count, token_profiles)
+        narrative = cache.get(key) if cache else None
+        if narrative is None:
+            try:
+                narrative = await narrate(addr, (total, small_tx_count, count, token_profiles), verbose=verbose, on_field=on_field)
+            except Exception as e:
+                if verbose:
+                    print(f"⚠️ llm stage failed: {e or type(e).__name__}")
+                narrative = {}
+            if cache and not validate_report(narrative):
+                cache.put(key, narrative)
+        if not narrative:
+            failed.append("llm")
+        result["narrative"] = narrative
+    return result
+
+def print_early_grade(path: str, value):
+    if path == "Summary.Credit Grade":
+        print(f"\n⚡ LLM Credit Grade: {value if value is not None else 'withdrawn'}")
+
+# Main program
+async def main(incremental: bool = False, llm: bool = False):
+    print("🔍 Solana Wallet Analyzer CLI - Credit Assessment")
+    while True:
+        addr = input("Please enter address or exit to quit: ").strip()
+        if addr.lower() in ("exit", "quit"):
+            break
+
+        result = await score_wallet(addr, incremental=incremental, llm=llm, on_field=print_early_grade)
+        analysis = result["analysis"]
+        print("\n📝 Credit Analysis:")
+        print(json.dumps(analysis, indent=2, ensure_ascii=False))
+        if result.get("narrative"):
+            print("\n📝 LLM Narrative:")
+            print(json.dumps(result["narrative"], indent=2, ensure_ascii=False))
 
         # Optional: Save to file
         save = input("Save analysis to file? (y/n): ").strip().lower()
         if save == "y":
             with open(f"credit_analysis_{addr}.json", "w", encoding="utf-8") as f:
-                json.dump(json.loads(analysis), f, indent=2, ensure_ascii=False)
+                json.dump(analysis, f, indent=2, ensure_ascii=False)
 
         print("-" * 50)
 
+    print(f"HTTP pool: {get_pool_stats()}")
+    if cache := get_tx_cache():
+        print(f"Transaction cache: {cache.report()}")
+    if llm and (report_cache := get_report_cache()):
+        print(f"Report cache: {report_cache.report()}")
+    await close_http_client()
+
+# Batch input: one address per line, CSV (address column or first column) or JSONL ({"address": ...})
+def read_addresses(lines) -> list[str]:
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        return []
+    if lines[0].startswith("{"):
+        return [json.loads(line)["address"].strip() for line in lines]
+    if "," in lines[0]:
+        rows = list(csv.reader(lines))
+        header = [c.strip().lower() for c in rows[0]]
+        if "address" in header:
+            col = header.index("address")
+            return [row[col].strip() for row in rows[1:] if len(row) > col and row[col].strip()]
+        return [row[0].strip() for row in rows if row and row[0].strip()]
+    # single-column CSV: drop the "address" header line
+    if lines[0].lower() == "address":
+        return lines[1:]
+    return lines
+
+# Cross-check an incremental result against a full walk of the same history
+async def verify_incremental(result: dict) -> bool:
+    if "transactions" in result["partial"]:
+        return True
+    full = await stream_wallet_stats(result["address"], verbose=False)
+    expected = (full.total, full.small, dict(full.types))
+    actual = (result["totalTransactions"], result["smallTransactions"], result["transactionTypes"])
+    if actual != expected:
+        print(f"⚠️ Incremental mismatch for {result['address']}: {actual} != full run {expected}", file=sys.stderr)
+        return False
+    return True
+
+# Batch program: score many wallets concurrently, one JSON line per wallet
+FEATURE_BATCH_SIZE = 100
+
+async def batch_main(input_path: str, output_path: str, concurrency: int = 10, incremental: bool = False, llm: bool = False, llm_batch: int = 0,
+                     snapshot: str = None, verify: bool = False):
+    global report_batcher, stake_snapshot
+    if input_path == "-":
+        addresses = read_addresses(sys.stdin)
+    else:
+        with open(input_path, encoding="utf-8") as f:
+            addresses = read_addresses(f)
+
+    report_batcher = ReportBatcher(llm_batch) if llm and llm_batch > 1 else None
+    if snapshot:
+        stake_snapshot = StakeSnapshot(snapshot, get_config().stake_snapshot_refresh_minutes * 60)
+        try:
+            await stake_snapshot.start_refresh()
+        except Exception as e:
+            print(f"⚠️ Stake snapshot unavailable, falling back to per-wallet lookups: {e}", file=sys.stderr)
+            stake_snapshot = None
+    sem = asyncio.Semaphore(concurrency)
+    start_time = time.time()
+    done = failed = mismatched = 0
+
+    async def run(addr: str) -> dict:
+        nonlocal mismatched
+        async with sem:
+            try:
+                result = await score_wallet(addr, verbose=False, incremental=incremental, llm=llm, defer_features=True)
+                if verify and incremental:
+                    mismatched += not await verify_incremental(result)
+                return result
+            except Exception as e:
+                return {"address": addr, "error": str(e)}
+
+    # Completed wallets are written in groups so their features come from one vectorized pass
+    pending = []
+
+    def write():
+        scored = [r for r in pending if "error" not in r]
+        for result, features in zip(scored, batch_features([r["features"] for r in scored])):
+            result["features"] = features
+        for result in pending:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        pending.clear()
+
+    out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    try:
+        for fut in asyncio.as_completed([run(addr) for addr in addresses]):
+            result = await fut
+            done += 1
+            failed += "error" in result
+            pending.append(result)
+            if len(pending) >= FEATURE_BATCH_SIZE:
+                write()
+            if done % 100 == 0:
+                print(f"Scored {done}/{len(addresses)} wallets in {int(time.time() - start_time)}s", file=sys.stderr)
+    finally:
+        write()
+        if out is not sys.stdout:
+            out.close()
+        if stake_snapshot:
+            await stake_snapshot.close()
+        await close_http_client()
+
+    print(f"✅ Batch finished: {done} wallets, {failed} failed, {time.time() - start_time:.1f}s", file=sys.stderr)
+    print(f"HTTP pool: {get_pool_stats()}", file=sys.stderr)
+    if verify and incremental:
+        print(f"Incremental check: {mismatched} of {done} wallets differ from a full run", file=sys.stderr)
+    if cache := get_tx_cache():
+        print(f"Transaction cache: {cache.report()}", file=sys.stderr)
+    if llm and (report_cache := get_report_cache()):
+        print(f"Report cache: {report_cache.report()}", file=sys.stderr)
+    if report_batcher:
+        print(f"LLM batches: {dict(report_batcher.stats)}", file=sys.stderr)
+
+# Cross-check the vectorized grades against score_rules row by row
+def verify_rescore(rows: list, scores: dict) -> int:
+    mismatched = 0
+    for i, r in enumerate(rows):
+        analysis = score_rules(r["totalTransactions"], r["smallTransactions"], r["transactionTypes"], r["tokenProfiles"])
+        expected = (analysis["Summary"]["Credit Grade"], analysis["Risk"]["Dust Attack"],
+                    analysis["Risk"]["High-frequency Arbitrage"], analysis["Risk"]["Low Liquidity Tokens"])
+        actual = (str(scores["grade"][i]), str(scores["dust_risk"][i]), str(scores["arbitrage_risk"][i]), str(scores["low_liquidity_risk"][i]))
+        if actual != expected:
+            mismatched += 1
+            print(f"⚠️ Rescore mismatch for {r['address']}: {actual} != score_rules {expected}", file=sys.stderr)
+    return mismatched
+
+# Re-grade a previous batch output offline with one vectorized call
+def rescore_main(input_path: str, output_path: str, verify: bool = False):
+    with open(input_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    rows = [r for r in rows if "error" not in r]
+    features = np.array([wallet_feature_row(r["totalTransactions"], r["smallTransactions"], r["transactionTypes"], r["tokenProfiles"])
+                         for r in rows], dtype=np.float64)
+    start_time = time.time()
+    scores = score_batch(features)
+    elapsed = time.time() - start_time
+
+    out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    try:
+        for i, r in enumerate(rows):
+            out.write(json.dumps({
+                "address": r["address"],
+                "grade": str(scores["grade"][i]),
+                "solTotal": float(scores["sol_total"][i]),
+                "dustRisk": str(scores["dust_risk"][i]),
+                "arbitrageRisk": str(scores["arbitrage_risk"][i]),
+                "lowLiquidityRisk": str(scores["low_liquidity_risk"][i]),
+            }) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ Rescored {len(rows)} wallets in {elapsed * 1000:.1f}ms", file=sys.stderr)
+    if verify:
+        print(f"Rescore check: {verify_rescore(rows, scores)} of {len(rows)} wallets differ from score_rules", file=sys.stderr)
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Solana Wallet Analyzer CLI - Credit Assessment")
+    parser.add_argument("--batch", metavar="FILE", help="score addresses from FILE (one per line, CSV or JSONL; '-' for stdin)")
+    parser.add_argument("--rescore", metavar="FILE", help="re-grade a previous batch JSONL output without fetching")
+    parser.add_argument("--output", default="-", help="JSONL output file for batch mode (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=10, help="wallets scored concurrently in batch mode")
+    parser.add_argument("--incremental", action="store_true", help="only fetch transactions newer than the last scored signature per wallet")
+    parser.add_argument("--llm", action="store_true", help="add an OpenAI narrative report on top of the local rules engine")
+    parser.add_argument("--stake-snapshot", metavar="SOURCE", help="batch mode: answer staked SOL from one snapshot of all stake accounts ('rpc' or a dump file)")
+    parser.add_argument("--epoch", type=int, help="current epoch for stake status (skips getEpochInfo; for offline snapshot dumps)")
+    parser.add_argument("--llm-batch", type=int, default=0, metavar="N", help="pack up to N wallets into one LLM request in batch mode")
+    parser.add_argument("--verify", action="store_true", help="with --batch --incremental: re-walk each wallet's full history; with --rescore: re-grade each row with score_rules; report mismatches")
+    args = parser.parse_args()
+
+    if args.epoch is not None:
+        configure(replace(get_config(), solana_epoch=args.epoch))
+    if args.rescore:
+        rescore_main(args.rescore, args.output, args.verify)
+    elif args.batch:
+        asyncio.run(batch_main(args.batch, args.output, args.concurrency, args.incremental, args.llm, args.llm_batch,
+                               args.stake_snapshot, args.verify))
+    else:
+        asyncio.run(main(args.incremental, args.llm))
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# Local Helius / Solana RPC / OpenAI stand-in for offline benchmarking of may13ien.py.
+#
+#   python mock_server.py --port 8899 --latency 40 --jitter 20 --error-rate 0.01 --rate-429 0.02
+#
+# then export the variables it prints (HELIUS_API_URL, HELIUS_RPC_URL, SOLANA_RPC_URLS,
+# OPENAI_BASE_URL, dummy keys) and run may13ien.py as usual.
+#
+# Routes (one port, service chosen by path prefix):
+#   GET  /helius/v0/addresses/{addr}/transactions   paginated history (before=, until=, limit=)
+#   POST /helius/v0/transactions                    parse signatures
+#   POST /rpc/                                      Helius RPC: getAssetsByOwner
+#   POST /solana                                    Solana RPC: getProgramAccounts, getMultipleAccounts, getEpochInfo
+#   POST /openai/v1/chat/completions                canned credit report, streaming or not
+#
+# Full getProgramAccounts scans only see wallets already queried; pass --wallets FILE to
+# benchmark --stake-snapshot against a fresh server.
+#
+# Responses are synthetic and deterministic per address. With --fixtures DIR, a recorded
+# response is replayed instead when DIR/<fixture_key>.json exists. Adding --record forwards
+# requests without a fixture to the real services (--upstream-*) and saves the answers there,
+# so one run with real keys records a corpus that later runs replay offline:
+#
+#   python mock_server.py --fixtures fixtures --record      # export real keys, run may13ien.py once
+#   python mock_server.py --fixtures fixtures               # replay
+#
+# Streamed completions are never recorded or replayed.
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, parse_qsl, urlencode
+import base64
+
+import numpy as np
+
+from may13ien import STAKE_DTYPE, STAKE_ACCOUNT_SIZE, STAKE_TAG_DELEGATED, b58decode, b58encode, score_rules
+
+TX_TYPES = ["TRANSFER", "TRANSFER", "SWAP", "SWAP", "NFT_SALE", "UNKNOWN"]
+TX_SOURCES = ["SYSTEM_PROGRAM", "JUPITER", "RAYDIUM", "MAGIC_EDEN"]
+TOKENS = [("USDC", 6), ("BONK", 5), ("JUP", 6), ("mSOL", 9), ("RAY", 6), ("WIF", 6), ("PYTH", 6)]
+EPOCH = 600
+BASE_TIME = 1750000000  # newest synthetic transaction; fixed so a signature always returns the same data
+
+# Request key for recorded fixtures: method, path, sorted query without api-key, canonical JSON body
+def fixture_key(method: str, path: str, body) -> str:
+    url = urlsplit(path)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(url.query, keep_blank_values=True) if k != "api-key"))
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":")) if body is not None else ""
+    return hashlib.sha256(f"{method} {url.path}?{query}\n{canonical}".encode()).hexdigest()
+
+# Local path prefix -> option holding the real service it stands in for
+UPSTREAMS = (("/helius", "upstream_helius_api"), ("/rpc", "upstream_helius_rpc"),
+             ("/solana", "upstream_solana"), ("/openai/v1", "upstream_openai"))
+
+def wallet_rng(address: str, salt: str = "") -> random.Random:
+    return random.Random(hashlib.sha256((salt + address).encode()).digest())
+
+def pubkey_bytes(address: str) -> bytes:
+    try:
+        raw = b58decode(address)
+        if len(raw) == 32:
+            return raw
+    except KeyError:
+        pass
+    return hashlib.sha256(address.encode()).digest()
+
+class SyntheticChain:
+    def __init__(self, history: int, assets: int, stake_pool: int):
+        self.history = history
+        self.assets = assets
+        self.lock = threading.Lock()
+        self.stake_accounts = {}  # pubkey -> (lamports, data)
+        self.stake_by_authority = {}
+        for i in range(stake_pool):
+            self.add_stake_accounts(f"pool-{i}")
+
+    # Signatures encode wallet and position, so /v0/transactions can regenerate them
+    def transaction(self, address: str, i: int) -> dict:
+        rng = wallet_rng(address, f"tx{i}")
+        gap = wallet_rng(address, "gap").randint(600, 86400)  # per-wallet spacing keeps history newest-first
+        other = b58encode(hashlib.sha256(f"{address}{i}".encode()).digest())
+        incoming = rng.random() < 0.5
+        amount = rng.choice([rng.randint(1, 10**7), rng.randint(10**8, 5 * 10**10)])
+        tx_type = rng.choice(TX_TYPES)
+        token_transfers = []
+        if tx_type == "SWAP" or rng.random() < 0.2:
+            symbol, decimals = rng.choice(TOKENS)
+            token_transfers.append({
+                "fromUserAccount": other if incoming else address,
+                "toUserAccount": address if incoming else other,
+                "mint": self.mint(symbol),
+                "tokenAmount": round(rng.uniform(0.1, 1000), decimals),
+            })
+        return {
+            "signature": f"{address}-{i}",
+            "timestamp": BASE_TIME - i * gap - rng.randint(0, gap - 1),
+            "fee": 5000,
+            "type": tx_type,
+            "source": rng.choice(TX_SOURCES),
+            "nativeTransfers": [{
+                "fromUserAccount": other if incoming else address,
+                "toUserAccount": address if incoming else other,
+                "amount": amount,
+            }],
+            "tokenTransfers": token_transfers,
+        }
+
+    def mint(self, symbol: str) -> str:
+        return b58encode(hashlib.sha256(f"mint-{symbol}".encode()).digest())
+
+    def history_page(self, address: str, before: str = None, until: str = None, limit: int = 100) -> list:
+        size = wallet_rng(address, "size").randint(self.history // 4, self.history)
+        start = int(before.rsplit("-", 1)[1]) + 1 if before else 0
+        stop = int(until.rsplit("-", 1)[1]) if until else size
+        return [self.transaction(address, i) for i in range(start, min(start + limit, stop, size))]
+
+    def parse(self, signatures: list) -> list:
+        txs = []
+        for sig in signatures:
+            address, _, i = sig.rpartition("-")
+            if address and i.isdigit():
+                txs.append(self.transaction(address, int(i)))
+        return txs
+
+    def asset_items(self, address: str) -> list:
+        rng = wallet_rng(address, "assets")
+        items = []
+        for i in range(rng.randint(0, self.assets)):
+            if rng.random() < 0.6:
+                symbol, decimals = rng.choice(TOKENS)
+                items.append({"id": self.mint(symbol), "interface": "FungibleToken",
+                              "token_info": {"symbol": symbol, "decimals": decimals, "balance": rng.randint(1, 10**12)}})
+            else:
+                items.append({"id": b58encode(hashlib.sha256(f"{address}nft{i}".encode()).digest()), "interface": "V1_NFT"})
+        return items
+
+    def get_assets_by_owner(self, params: dict) -> dict:
+        address = params["ownerAddress"]
+        page, limit = params.get("page", 1), params.get("limit", 1000)
+        options = params.get("options", {})
+        items = self.asset_items(address)
+        result = {"total": 0, "limit": limit, "page": page, "items": items[(page - 1) * limit:page * limit]}
+        result["total"] = len(result["items"])
+        if options.get("showGrandTotal"):
+            result["grand_total"] = len(items)
+        if options.get("showNativeBalance"):
+            result["nativeBalance"] = {"lamports": wallet_rng(address, "sol").randint(0, 50 * 10**9)}
+        return result
+
+    # Stake accounts use the real StakeStateV2 layout so the client-side decoder is exercised
+    def add_stake_accounts(self, address: str) -> list:
+        with self.lock:
+            if address in self.stake_by_authority:
+                return self.stake_by_authority[address]
+            rng = wallet_rng(address, "stake")
+            authority = pubkey_bytes(address)
+            pubkeys = []
+            for i in range(rng.choice([0, 0, 1, 1, 2, 3])):
+                lamports = rng.randint(10**9, 200 * 10**9)
+                record = np.zeros(1, dtype=STAKE_DTYPE)
+                record["tag"] = STAKE_TAG_DELEGATED
+                record["rent_exempt_reserve"] = 2282880
+                record["staker"] = np.void(authority)
+                record["withdrawer"] = np.void(authority)
+                record["voter"] = np.void(hashlib.sha256(f"voter{rng.randint(0, 20)}".encode()).digest())
+                record["stake"] = lamports - 2282880
+                record["activation_epoch"] = rng.choice([EPOCH - 100, EPOCH - 5, EPOCH])
+                record["deactivation_epoch"] = rng.choice([np.iinfo(np.uint64).max] * 3 + [EPOCH, EPOCH - 50])
+                record["warmup_cooldown_rate"] = 0.25
+                pubkey = b58encode(hashlib.sha256(f"{address}stake{i}".encode()).digest())
+                self.stake_accounts[pubkey] = (lamports, record.tobytes().ljust(STAKE_ACCOUNT_SIZE, b"\0"))
+                pubkeys.append(pubkey)
+            self.stake_by_authority[address] = pubkeys
+            return pubkeys
+
+    def account_info(self, pubkey: str, options: dict) -> dict:
+        lamports, data = self.stake_accounts[pubkey]
+        data_slice = options.get("dataSlice")
+        if data_slice:
+            data = data[data_slice["offset"]:data_slice["offset"] + data_slice["length"]]
+        return {"lamports": lamports, "owner": "Stake11111111111111111111111111111111111111", "executable": False,
+                "rentEpoch": EPOCH, "data": [base64.b64encode(data).decode(), "base64"]}
+
+    def get_program_accounts(self, params: list) -> list:
+        options = params[1] if len(params) > 1 else {}
+        memcmp = [f["memcmp"] for f in options.get("filters", []) if "memcmp" in f]
+        if memcmp:
+            address = memcmp[0]["bytes"]
+            self.add_stake_accounts(address)
+            wanted = pubkey_bytes(address)
+            offset = memcmp[0]["offset"]
+            pubkeys = [p for p, (_, data) in self.stake_accounts.items() if data[offset:offset + 32] == wanted]
+        else:
+            pubkeys = list(self.stake_accounts)
+        return [{"pubkey": p, "account": self.account_info(p, options)} for p in pubkeys]
+
+    def get_multiple_accounts(self, params: list) -> dict:
+        options = params[1] if len(params) > 1 else {}
+        return {"context": {"slot": EPOCH * 432000},
+                "value": [self.account_info(p, options) if p in self.stake_accounts else None for p in params[0]]}
+
+# Canned report in the prompt's schema, wrapped in a markdown fence like real model output
+def chat_report(prompt: str, rng: random.Random) -> str:
+    wallets = [line.split()[1].rstrip(":") for line in prompt.splitlines() if line.startswith("Wallet ")]
+
+    def one() -> dict:
+        total = rng.randint(0, 100)
+        swaps = rng.randint(0, total)
+        counts = {"SWAP": swaps, "TRANSFER": rng.randint(0, total - swaps)}
+        return score_rules(total, rng.randint(0, 200), counts, [{"symbol": "SOL", "balance": round(rng.uniform(0, 30), 3)}])
+
+    report = {addr: one() for addr in wallets} if wallets else one()
+    return "```json\n" + json.dumps(report, indent=2) + "\n```"
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SolanaCreditMock/1.0"
+
+    def log_message(self, fmt, *args):
+        if self.server.args.verbose:
+            super().log_message(fmt, *args)
+
+    def send_json(self, status: int, body, headers: dict = None):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    # Latency, 5xx and 429 injection shared by every route
+    def inject_faults(self) -> bool:
+        args, stats = self.server.args, self.server.stats
+        stats["requests"] += 1
+        delay = max(0.0, random.gauss(args.latency, args.jitter)) / 1000
+        if delay:
+            time.sleep(delay)
+        roll = random.random()
+        if roll < args.rate_429:
+            stats["429"] += 1
+            self.send_json(429, {"error": "rate limited"}, {"Retry-After": str(args.retry_after)})
+            return True
+        if roll < args.rate_429 + args.error_rate:
+            stats["5xx"] += 1
+            self.send_json(500, {"error": "injected failure"})
+            return True
+        return False
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def replay(self, body) -> bool:
+        fixtures = self.server.args.fixtures
+        if not fixtures:
+            return False
+        path = os.path.join(fixtures, fixture_key(self.command, self.path, body) + ".json")
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding="utf-8") as f:
+            self.send_json(200, json.load(f))
+        self.server.stats["replayed"] += 1
+        return True
+
+    # Record mode: forward to the real service and save its answer under the request's fixture key
+    def record(self, body) -> bool:
+        args = self.server.args
+        if not args.record or (body and body.get("stream")):
+            return False
+        url = urlsplit(self.path)
+        for prefix, option in UPSTREAMS:
+            if url.path == prefix or url.path.startswith(prefix + "/"):
+                break
+        else:
+            return False
+        target = getattr(args, option) + url.path[len(prefix):] + (f"?{url.query}" if url.query else "")
+        headers = {"Content-Type": "application/json"}
+        if self.headers.get("Authorization"):
+            headers["Authorization"] = self.headers["Authorization"]
+        data = json.dumps(body).encode() if body is not None else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(target, data=data, headers=headers, method=self.command), timeout=120) as response:
+                answer = json.load(response)
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get("Retry-After")
+            self.send_json(e.code, {"error": f"upstream: {e.reason}"}, {"Retry-After": retry_after} if retry_after else None)
+            return True
+        except (urllib.error.URLError, TimeoutError) as e:
+            self.send_json(502, {"error": f"upstream: {e}"})
+            return True
+        os.makedirs(args.fixtures, exist_ok=True)
+        with open(os.path.join(args.fixtures, fixture_key(self.command, self.path, body) + ".json"), "w", encoding="utf-8") as f:
+            json.dump(answer, f)
+        self.server.stats["recorded"] += 1
+        self.send_json(200, answer)
+        return True
+
+    def do_GET(self):
+        if self.inject_faults() or self.replay(None) or self.record(None):
+            return
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts[:3] == ["helius", "v0", "addresses"] and len(parts) == 5 and parts[4] == "transactions":
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            page = self.server.chain.history_page(parts[3], query.get("before"), query.get("until"), int(query.get("limit", 100)))
+            return self.send_json(200, page)
+        self.send_json(404, {"error": f"no route for GET {url.path}"})
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.inject_faults() or self.replay(body) or self.record(body):
+            return
+        chain = self.server.chain
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/helius/v0/transactions":
+            return self.send_json(200, chain.parse(body.get("transactions", [])))
+        if path in ("/rpc", "/solana"):
+            return self.rpc(body)
+        if path == "/openai/v1/chat/completions":
+            return self.chat(body)
+        self.send_json(404, {"error": f"no route for POST {path}"})
+
+    def rpc(self, body: dict):
+        chain = self.server.chain
+        method, params = body.get("method"), body.get("params")
+        handlers = {
+            "getAssetsByOwner": lambda: chain.get_assets_by_owner(params),
+            "getProgramAccounts": lambda: chain.get_program_accounts(params),
+            "getMultipleAccounts": lambda: chain.get_multiple_accounts(params),
+            "getEpochInfo": lambda: {"epoch": EPOCH, "slotIndex": 1000, "slotsInEpoch": 432000, "absoluteSlot": EPOCH * 432000},
+        }
+        if method not in handlers:
+            return self.send_json(200, {"jsonrpc": "2.0", "id": body.get("id"), "error": {"code": -32601, "message": "Method not found"}})
+        self.send_json(200, {"jsonrpc": "2.0", "id": body.get("id"), "result": handlers[method]()})
+
+    def chat(self, body: dict):
+        prompt = body["messages"][-1]["content"]
+        content = chat_report(prompt, random.Random(hashlib.sha256(prompt.encode()).digest()))
+        created = int(time.time())
+        if not body.get("stream"):
+            return self.send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4},
+            })
+
+        # Server-sent events, a few characters per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [content[i:i + 12] for i in range(0, len(content), 12)]
+        for i, piece in enumerate(pieces):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": "stop" if i == len(pieces) - 1 else None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.args.stream_delay / 1000)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Helius/Solana RPC/OpenAI stand-in for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean added latency per request (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency standard deviation (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--stream-delay", type=float, default=5.0, help="delay between streamed completion chunks (ms)")
+    parser.add_argument("--history", type=int, default=600, help="maximum transactions per synthetic wallet")
+    parser.add_argument("--assets", type=int, default=40, help="maximum DAS assets per synthetic wallet")
+    parser.add_argument("--stake-pool", type=int, default=2000, help="extra stake accounts returned by full program scans")
+    parser.add_argument("--wallets", metavar="FILE", help="pre-create stake accounts for these addresses so full snapshot scans include them")
+    parser.add_argument("--fixtures", metavar="DIR", help="replay recorded responses from DIR/<fixture_key>.json")
+    parser.add_argument("--record", action="store_true", help="forward requests without a fixture to the real services and save the answers in --fixtures DIR")
+    parser.add_argument("--upstream-helius-api", default="https://api.helius.xyz")
+    parser.add_argument("--upstream-helius-rpc", default="https://rpc.helius.xyz")
+    parser.add_argument("--upstream-solana", default="https://api.mainnet-beta.solana.com")
+    parser.add_argument("--upstream-openai", default="https://api.openai.com/v1")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+    if args.record and not args.fixtures:
+        parser.error("--record needs --fixtures DIR to write to")
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    server.args = args
+    server.stats = {"requests": 0, "429": 0, "5xx": 0, "replayed": 0, "recorded": 0}
+    server.chain = SyntheticChain(args.history, args.assets, args.stake_pool)
+    if args.wallets:
+        with open(args.wallets, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    server.chain.add_stake_accounts(line.strip())
+
+    base = f"http://{args.host}:{args.port}"
+    print("Mock services listening; use these settings:", file=sys.stderr)
+    if args.record:
+        print("Recording: keep your real HELIUS_API_KEY and OPENAI_API_KEY exported", file=sys.stderr)
+    else:
+        print("export HELIUS_API_KEY=mock OPENAI_API_KEY=mock")
+    print(f"export HELIUS_API_URL={base}/helius HELIUS_RPC_URL={base}/rpc")
+    print(f"export SOLANA_RPC_URLS={base}/solana OPENAI_BASE_URL={base}/openai/v1")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {server.stats}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()